@@ -0,0 +1,89 @@
+"""
+Peak memory of the CSV import pipeline.
+
+Generates a CSV with --rows random orders inside New York, runs
+process_orders_csv() on it inside a transaction that is rolled back,
+and reports the peak RSS growth and the size of the in-flight OrderBatch,
+both scaled to one million rows.
+
+Run from the backend directory:
+    python benchmarks/import_memory.py --rows 1000000
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "bettermetesttask.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import transaction  # noqa: E402
+
+from counter import services  # noqa: E402
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_csv(path, rows, chunk=50_000):
+    rng = np.random.default_rng(42)
+    for start in range(0, rows, chunk):
+        size = min(chunk, rows - start)
+        pd.DataFrame({
+            "id": np.arange(start, start + size),
+            "longitude": rng.uniform(-78.5, -73.8, size).round(6),
+            "latitude": rng.uniform(40.6, 43.0, size).round(6),
+            "timestamp": "2025-11-04 10:17:04.915257",
+            "subtotal": rng.uniform(1, 500, size).round(2),
+        }).to_csv(path, mode="a", header=start == 0, index=False)
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "orders.csv"
+        write_csv(path, args.rows)
+
+        batch_bytes = []
+        build_order_batch = services.build_order_batch
+
+        def measured_build(*a, **kw):
+            batch = build_order_batch(*a, **kw)
+            batch_bytes.append(batch.nbytes())
+            return batch
+
+        services.build_order_batch = measured_build
+
+        baseline = peak_rss_mb()
+        started = time.perf_counter()
+        with transaction.atomic():
+            with open(path, "rb") as f:
+                imported = services.process_orders_csv(f)
+            transaction.set_rollback(True)
+        elapsed = time.perf_counter() - started
+        peak = peak_rss_mb()
+
+    per_million = 1_000_000 / max(imported, 1)
+    print(f"rows in CSV:          {args.rows}")
+    print(f"rows imported:        {imported}")
+    print(f"import time:          {elapsed:.1f} s")
+    print(f"peak RSS:             {peak:.0f} MB (baseline {baseline:.0f} MB)")
+    print(f"peak RSS growth:      {(peak - baseline) * per_million:.0f} MB per 1M rows")
+    print(f"OrderBatch arrays:    {batch_bytes[0] / 2**20 * per_million:.0f} MB per 1M rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    main(parser.parse_args())
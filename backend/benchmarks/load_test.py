@@ -0,0 +1,114 @@
+"""
+Simple HTTP load test for the order endpoints.
+
+Opens --concurrency connections at once (plain asyncio, no extra
+dependencies) and reports throughput and latency percentiles, so the same
+run can be repeated against the WSGI (gunicorn) and ASGI (uvicorn)
+deployments and compared.
+
+Examples:
+    python benchmarks/load_test.py --endpoint list --concurrency 200 --requests 5000
+    python benchmarks/load_test.py --endpoint create --concurrency 50 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+# Random point inside New York state for POST /orders
+def random_order():
+    return {
+        "latitude": round(random.uniform(40.6, 43.0), 6),
+        "longitude": round(random.uniform(-78.5, -73.8), 6),
+        "subtotal": round(random.uniform(1, 500), 2),
+        "timestamp": "2025-11-04 10:17:04",
+    }
+
+
+def build_request(endpoint, host, path_prefix, page_size):
+    if endpoint == "list":
+        path = f"{path_prefix}/orders/list?page_size={page_size}"
+        return (
+            f"GET {path} HTTP/1.1\r\nHost: {host}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode()
+    body = json.dumps(random_order()).encode()
+    return (
+        f"POST {path_prefix}/orders HTTP/1.1\r\nHost: {host}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    ).encode() + body
+
+
+async def send_one(args, host, port, path_prefix):
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(build_request(args.endpoint, host, path_prefix, args.page_size))
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    status = int(status_line.split()[1]) if status_line else 0
+    return status, time.perf_counter() - started
+
+
+async def worker(args, host, port, path_prefix, counter, latencies, errors):
+    while counter[0] < args.requests:
+        counter[0] += 1
+        try:
+            status, elapsed = await send_one(args, host, port, path_prefix)
+        except OSError:
+            errors.append(0)
+            continue
+        if status != 200:
+            errors.append(status)
+        else:
+            latencies.append(elapsed)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def main(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    path_prefix = url.path.rstrip("/")
+    counter, latencies, errors = [0], [], []
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        worker(args, host, port, path_prefix, counter, latencies, errors)
+        for _ in range(args.concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+
+    print(f"endpoint:     {args.endpoint}")
+    print(f"concurrency:  {args.concurrency}")
+    print(f"requests:     {len(latencies)} ok, {len(errors)} failed")
+    print(f"duration:     {elapsed:.2f} s")
+    print(f"throughput:   {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        ms = [v * 1000 for v in latencies]
+        print(f"latency mean: {statistics.mean(ms):.1f} ms")
+        for pct in (50, 95, 99):
+            print(f"latency p{pct}:  {percentile(ms, pct):.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://127.0.0.1:8000/counter")
+    parser.add_argument("--endpoint", choices=["list", "create"], default="list")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
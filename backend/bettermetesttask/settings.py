@@ -83,6 +83,23 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'bettermetesttask.wsgi.application'
 
+# Serve the async versions of the list/create order views.
+# Enable only when running under an ASGI server (uvicorn), under WSGI
+# async views are slower than the sync ones.
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "False") == "True"
+# Threads for county/city lookups made from the async views (counter/services.py)
+GEO_EXECUTOR_WORKERS = int(os.environ.get("GEO_EXECUTOR_WORKERS", 4))
+
+# Encode list responses with orjson (if installed). Faster for large pages,
+# but the JSON is only semantically equal to the default JsonResponse output.
+ORJSON_RESPONSES = os.environ.get("ORJSON_RESPONSES", "False") == "True"
+
+# Where profiles of requests made with the X-Profile header / ?profile=1
+# flag are stored (staff users only, see counter/profiling.py)
+PROFILE_DIR = os.environ.get("PROFILE_DIR", BASE_DIR / "profiles")
+# Only the newest PROFILE_KEEP profiles are kept, older ones are deleted
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 20))
+
 
 
 
@@ -106,10 +123,29 @@ WSGI_APPLICATION = 'bettermetesttask.wsgi.application'
 #     )
 # DATABASES
 DATABASE_URL = os.environ.get("DATABASE_URL")
+# Native psycopg 3 connection pool (Django 5.1+, PostgreSQL only).
+# Each gunicorn worker keeps its own pool, so DB_POOL_MAX_SIZE * workers
+# must stay below max_connections of the database.
+DB_POOL = os.environ.get("DB_POOL", "False") == "True"
 if DATABASE_URL:
     DATABASES = {
-        "default": dj_database_url.parse(DATABASE_URL, conn_max_age=600, ssl_require=True)
+        "default": dj_database_url.parse(
+            DATABASE_URL,
+            # Persistent connections and the pool are mutually exclusive
+            conn_max_age=0 if DB_POOL else int(os.environ.get("DB_CONN_MAX_AGE", 600)),
+            ssl_require=os.environ.get("DB_SSL_REQUIRE", "True") == "True",
+        )
     }
+    # Check reused connections before a request instead of failing on a dead one
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = (
+        os.environ.get("DB_CONN_HEALTH_CHECKS", "True") == "True"
+    )
+    if DB_POOL:
+        DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+            "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        }
 else:
     # fallback на SQLite для локальной разработки
     DATABASES = {
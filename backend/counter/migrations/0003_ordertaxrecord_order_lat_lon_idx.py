@@ -0,0 +1,17 @@
+# Generated by Django 5.2.11 on 2026-10-19 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counter', '0002_auto_20260227_1235'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ordertaxrecord',
+            index=models.Index(fields=['latitude', 'longitude'], name='order_lat_lon_idx'),
+        ),
+    ]
@@ -27,6 +27,12 @@ class OrderTaxRecord(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Prefilter for the bbox / radius filters on the order list
+            models.Index(fields=["latitude", "longitude"], name="order_lat_lon_idx"),
+        ]
+
     def __str__(self):
         return f"{self.purchase_date} - {self.total_amount}"
     
@@ -0,0 +1,168 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+
+from .models import OrderTaxRecord
+
+# Decimal places of the money and rate columns of OrderTaxRecord
+MONEY_DIGITS = 2
+RATE_DIGITS = 5
+
+# Subtotals must be below this in absolute value (after rounding to cents)
+# to fit OrderTaxRecord.subtotal, a DecimalField(12, 2)
+_subtotal_field = OrderTaxRecord._meta.get_field("subtotal")
+MAX_SUBTOTAL = 10 ** (_subtotal_field.max_digits - _subtotal_field.decimal_places)
+
+# x * 100 is not exact in floating point (1.005 * 100 == 100.49999999999999),
+# values this close to half a cent are rounded from their decimal digits instead
+HALF_CENT_TOLERANCE = 1e-3
+
+# Rows turned into model instances at a time when writing to the database
+WRITE_BATCH_SIZE = 2000
+
+
+def rate_to_int(rate):
+    """Decimal rate (up to 5 decimal places) -> integer in 1e-5 units."""
+    return int(Decimal(rate).scaleb(RATE_DIGITS).to_integral_value())
+
+
+def money_to_int(values):
+    """
+    Float amounts -> int64 array in cents, rounded half away from zero like
+    Decimal(str(x)).quantize(Decimal("0.01"), ROUND_HALF_UP), which is
+    also how PostgreSQL rounds a value stored into numeric(12, 2).
+    Raises ValueError for NaN/inf and for amounts that do not fit the
+    subtotal column (checked before the int64 cast, which would overflow).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not np.isfinite(values).all():
+        raise ValueError("Subtotal must be a finite number")
+    scaled = values * 10 ** MONEY_DIGITS
+    cents = np.rint(scaled)
+    near_half = np.flatnonzero(
+        np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < HALF_CENT_TOLERANCE)
+    for i, value in zip(near_half, values[near_half].tolist()):
+        cents[i] = int(Decimal(str(value)).scaleb(MONEY_DIGITS).to_integral_value(ROUND_HALF_UP))
+    if (np.abs(cents) >= MAX_SUBTOTAL * 10 ** MONEY_DIGITS).any():
+        raise ValueError(f"Subtotal must be less than {MAX_SUBTOTAL} in absolute value")
+    return cents.astype(np.int64)
+
+
+class OrderBatch:
+    """
+    Memory-compact, columnar representation of orders during CSV import.
+
+    Instead of one OrderTaxRecord instance per row (~1-2 KB each with _state,
+    the field dict and Decimal objects) every column is a NumPy array:
+    - purchase_date: datetime64 (UTC)
+    - latitude, longitude: float64
+    - subtotal: int64 in cents, rounded half away from zero (money_to_int)
+    - rates: int32 in 1e-5 units, tax/total: int64 in 1e-7 units
+      (subtotal in cents * rate in 1e-5 units), so the sums are exact.
+      They are computed from the rounded subtotal: for inputs with more than
+      2 decimal places they can differ by a cent from calculate_totals(),
+      which multiplies the unrounded Decimal(str(x))
+    - county/city: int32 codes into the county_names/city_names lists,
+      -1 means none
+
+    Model instances are only built per WRITE_BATCH_SIZE rows in save().
+    """
+
+    __slots__ = (
+        "purchase_date", "latitude", "longitude", "subtotal",
+        "county_codes", "city_codes", "county_names", "city_names",
+        "state_rate", "county_rate", "city_rate", "special_rates",
+        "composite_tax_rate", "tax_amount", "total_amount",
+    )
+
+    def __init__(self, purchase_date, latitude, longitude, subtotal,
+                 county_codes, city_codes, county_names, city_names,
+                 state_rate, county_rate, city_rate, special_rates):
+        self.purchase_date = purchase_date
+        self.latitude = latitude
+        self.longitude = longitude
+        self.subtotal = subtotal
+        self.county_codes = county_codes
+        self.city_codes = city_codes
+        self.county_names = county_names
+        self.city_names = city_names
+        self.state_rate = state_rate
+        self.county_rate = county_rate
+        self.city_rate = city_rate
+        self.special_rates = special_rates
+        # Same formulas as OrderTaxRecord.calculate_totals(), in scaled integers
+        self.composite_tax_rate = state_rate + county_rate + city_rate + special_rates
+        self.tax_amount = subtotal * self.composite_tax_rate.astype(np.int64)
+        self.total_amount = subtotal * 10 ** RATE_DIGITS + self.tax_amount
+
+    def __len__(self):
+        return len(self.subtotal)
+
+    def nbytes(self):
+        """Memory used by the per-row arrays."""
+        return sum(
+            value.nbytes for value in (getattr(self, name) for name in self.__slots__)
+            if isinstance(value, np.ndarray)
+        )
+
+    def iter_objects(self, start, stop):
+        """Builds unsaved OrderTaxRecord instances for rows [start, stop)."""
+        timestamps = pd.DatetimeIndex(self.purchase_date[start:stop]).tz_localize("UTC")
+        money_exp = -MONEY_DIGITS
+        rate_exp = -RATE_DIGITS
+        amount_exp = -(MONEY_DIGITS + RATE_DIGITS)
+        # Few distinct rates, so their Decimal objects are shared
+        rates = {}
+
+        def rate(value):
+            if value not in rates:
+                rates[value] = Decimal(value).scaleb(rate_exp)
+            return rates[value]
+
+        columns = zip(
+            timestamps.to_pydatetime(),
+            self.latitude[start:stop].tolist(),
+            self.longitude[start:stop].tolist(),
+            self.subtotal[start:stop].tolist(),
+            self.county_codes[start:stop].tolist(),
+            self.city_codes[start:stop].tolist(),
+            self.state_rate[start:stop].tolist(),
+            self.county_rate[start:stop].tolist(),
+            self.city_rate[start:stop].tolist(),
+            self.special_rates[start:stop].tolist(),
+            self.composite_tax_rate[start:stop].tolist(),
+            self.tax_amount[start:stop].tolist(),
+            self.total_amount[start:stop].tolist(),
+        )
+        for (ts, lat, lon, subtotal, county, city, state_rate, county_rate,
+             city_rate, special, composite, tax, total) in columns:
+            yield OrderTaxRecord(
+                purchase_date=ts,
+                latitude=lat,
+                longitude=lon,
+                subtotal=Decimal(subtotal).scaleb(money_exp),
+                state_name="NY",
+                county_name=self.county_names[county] if county >= 0 else None,
+                city_name=self.city_names[city] if city >= 0 else None,
+                state_rate=rate(state_rate),
+                county_rate=rate(county_rate),
+                city_rate=rate(city_rate),
+                special_rates=rate(special),
+                composite_tax_rate=rate(composite),
+                tax_amount=Decimal(tax).scaleb(amount_exp),
+                total_amount=Decimal(total).scaleb(amount_exp),
+            )
+
+    def save(self, batch_size=WRITE_BATCH_SIZE):
+        """
+        Inserts all rows with bulk_create, building at most batch_size
+        model instances at a time. The whole import is one transaction,
+        like a single bulk_create() call.
+        """
+        with transaction.atomic():
+            for start in range(0, len(self), batch_size):
+                OrderTaxRecord.objects.bulk_create(
+                    list(self.iter_objects(start, start + batch_size)))
+        return len(self)
@@ -0,0 +1,205 @@
+import cProfile
+import json
+import pstats
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse
+from django.urls import reverse
+
+# pyinstrument is optional: with ?profile=sample we use its sampling profiler
+# when it is installed, otherwise we fall back to cProfile
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:  # pragma: no cover - depends on the environment
+    SamplingProfiler = None
+
+
+# Limits for the stored SQL log (bulk_create statements can be huge)
+MAX_RECORDED_QUERIES = 500
+MAX_SQL_LENGTH = 1000
+
+# Functions from our app listed in the summary, by cumulative time
+MAX_HOTSPOTS = 20
+
+# Values of the X-Profile header / ?profile= flag that turn profiling on
+PROFILE_FLAGS = ("1", "true", "sample")
+
+_active_session = ContextVar("profile_session", default=None)
+
+# Only one profiler can be active per process (cProfile raises ValueError
+# on Python 3.12+ otherwise), so concurrent profiled requests get a 409
+_profile_lock = threading.Lock()
+
+
+class ProfileSession:
+    """Collects stage timings and SQL for one profiled request."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.stages = defaultdict(float)
+        self.queries = []
+        self.query_count = 0
+        self.sql_time = 0.0
+
+    def record_sql(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.query_count += 1
+            self.sql_time += duration
+            if len(self.queries) < MAX_RECORDED_QUERIES:
+                self.queries.append({
+                    "sql": sql[:MAX_SQL_LENGTH],
+                    "many": many,
+                    "ms": round(duration * 1000, 3),
+                })
+
+
+@contextmanager
+def profile_stage(name):
+    """
+    Measures a named stage of the current profiled request.
+    Does nothing (no timing) when the request is not being profiled.
+    """
+    session = _active_session.get()
+    if session is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        session.stages[name] += time.perf_counter() - start
+
+
+def profile_dir():
+    return Path(settings.PROFILE_DIR)
+
+
+def profiling_requested(request):
+    """
+    Profiling is opt-in per request (X-Profile header or ?profile= flag)
+    and only for staff users, requests from anyone else run as usual.
+    """
+    flag = (request.headers.get("X-Profile") or request.GET.get("profile") or "").lower()
+    if flag not in PROFILE_FLAGS:
+        return None
+    user = getattr(request, "user", None)
+    if user is None or not user.is_staff:
+        return None
+    return flag
+
+
+def profiled(view):
+    """
+    Decorator for sync views: runs the view under a profiler when
+    profiling_requested() allows it, otherwise calls the view directly.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        flag = profiling_requested(request)
+        if flag is None:
+            return view(request, *args, **kwargs)
+        if not _profile_lock.acquire(blocking=False):
+            return JsonResponse(
+                {"error": "Another request is being profiled, try again later"}, status=409)
+        try:
+            return _run_profiled(flag, view, request, *args, **kwargs)
+        finally:
+            _profile_lock.release()
+
+    return wrapper
+
+
+def _run_profiled(flag, view, request, *args, **kwargs):
+    session = ProfileSession()
+    sampling = flag == "sample" and SamplingProfiler is not None
+    if sampling:
+        profiler = SamplingProfiler()
+        start_profiler, stop_profiler = profiler.start, profiler.stop
+    else:
+        profiler = cProfile.Profile()
+        start_profiler, stop_profiler = profiler.enable, profiler.disable
+
+    token = _active_session.set(session)
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(session.record_sql):
+            start_profiler()
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                stop_profiler()
+    finally:
+        total = time.perf_counter() - start
+        _active_session.reset(token)
+
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    if sampling:
+        artifact = directory / f"{session.id}.html"
+        artifact.write_text(profiler.output_html())
+        hotspots = []
+    else:
+        artifact = directory / f"{session.id}.prof"
+        profiler.dump_stats(artifact)
+        hotspots = _app_hotspots(profiler)
+
+    summary = {
+        "id": session.id,
+        "path": request.path,
+        "profiler": "pyinstrument" if sampling else "cProfile",
+        "artifact": artifact.name,
+        "total_ms": round(total * 1000, 3),
+        "stages_ms": {k: round(v * 1000, 3) for k, v in session.stages.items()},
+        "sql_ms": round(session.sql_time * 1000, 3),
+        "query_count": session.query_count,
+        "hotspots": hotspots,
+        "queries": session.queries,
+    }
+    (directory / f"{session.id}.json").write_text(json.dumps(summary, indent=2))
+    _prune_profiles(directory, settings.PROFILE_KEEP)
+
+    timings = [f"{name};dur={ms}" for name, ms in summary["stages_ms"].items()]
+    timings += [f"sql;dur={summary['sql_ms']}", f"total;dur={summary['total_ms']}"]
+    response["Server-Timing"] = ", ".join(timings)
+    response["X-Profile-Id"] = session.id
+    response["X-Profile-Url"] = reverse("profile_download_api", args=[session.id])
+    return response
+
+
+def _app_hotspots(profiler):
+    """Cumulative time of functions from this app (find_county, bulk_create callers, ...)."""
+    app_dir = str(Path(__file__).resolve().parent)
+    stats = pstats.Stats(profiler).stats
+    rows = [
+        {
+            "function": f"{Path(filename).name}:{lineno}({name})",
+            "calls": calls,
+            "cumulative_ms": round(cumtime * 1000, 3),
+        }
+        for (filename, lineno, name), (_, calls, _, cumtime, _) in stats.items()
+        if filename.startswith(app_dir)
+    ]
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:MAX_HOTSPOTS]
+
+
+def _prune_profiles(directory, keep):
+    """Deletes all but the newest `keep` profiles (artifact + summary)."""
+    summaries = sorted(
+        directory.glob("*.json"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for summary in summaries[keep:]:
+        for path in directory.glob(f"{summary.stem}.*"):
+            path.unlink(missing_ok=True)
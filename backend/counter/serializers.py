@@ -0,0 +1,100 @@
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+# orjson is optional and opt-in (ORJSON_RESPONSES setting): it encodes large
+# pages several times faster than the stdlib encoder used by JsonResponse,
+# but its output is not byte-for-byte the same.
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+# Upper bound for ?page_size= on list endpoints, protects the server from
+# clients requesting the whole table in one page
+MAX_PAGE_SIZE = 1000
+DEFAULT_PAGE_SIZE = 20
+
+# Columns fetched for GET /orders/list (order matters, see serialize_order_rows)
+ORDER_LIST_FIELDS = (
+    "id",
+    "latitude",
+    "longitude",
+    "subtotal",
+    "composite_tax_rate",
+    "tax_amount",
+    "total_amount",
+    "purchase_date",
+    "state_rate",
+    "county_rate",
+    "city_rate",
+    "special_rates",
+    "state_name",
+    "county_name",
+    "city_name",
+)
+
+
+def parse_page_size(raw):
+    """
+    Returns a page size in [1, MAX_PAGE_SIZE].
+    Invalid values fall back to DEFAULT_PAGE_SIZE.
+    """
+    try:
+        page_size = int(raw)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def format_timestamp(dt):
+    # Same output as dt.astimezone(utc).replace(microsecond=0).strftime("%Y-%m-%d %H:%M:%S"),
+    # but isoformat() is considerably cheaper than strftime()
+    return dt.astimezone(dt_timezone.utc).isoformat(" ", "seconds")[:19]
+
+
+def serialize_order_rows(rows):
+    """
+    Converts rows from values_list(*ORDER_LIST_FIELDS) into the dicts
+    returned by the list endpoint. Works on plain tuples, so no model
+    instances are built for the page.
+    """
+    return [
+        {
+            "id": str(pk),
+            "latitude": float(lat),
+            "longitude": float(lon),
+            "subtotal": float(subtotal),
+            "composite_tax_rate": float(composite),
+            "tax_amount": float(tax),
+            "total_amount": float(total),
+            "timestamp": format_timestamp(purchase_date),
+            "state_rate": float(state_rate),
+            "county_rate": float(county_rate),
+            "city_rate": float(city_rate),
+            "special_rates": float(special),
+            "state": state,
+            "county": county or "",
+            "city": city or "",
+        }
+        for (pk, lat, lon, subtotal, composite, tax, total, purchase_date,
+             state_rate, county_rate, city_rate, special, state, county, city) in rows
+    ]
+
+
+def fast_json_response(data, status=200):
+    """
+    By default this is a plain JsonResponse, so the output is byte-for-byte
+    the same as before. With ORJSON_RESPONSES=True (and orjson installed)
+    the data is encoded with orjson instead. That output is only
+    semantically equal: no whitespace after separators, non-ASCII
+    characters as raw UTF-8 instead of \\u escapes, and floats without
+    exponents (0.00001 instead of 1e-05).
+    """
+    if orjson is None or not settings.ORJSON_RESPONSES:
+        return JsonResponse(data, status=status)
+    return HttpResponse(
+        orjson.dumps(data), status=status, content_type="application/json"
+    )
@@ -1,8 +1,17 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
 import pandas as pd
+import shapely
 from decimal import Decimal
 from shapely.geometry import Point
+from django.conf import settings
 
+from .profiling import profile_stage
 from .geo_loader import COUNTIES, COUNTIES_TREE, CITIES, CITIES_TREE
+from .order_batch import MAX_SUBTOTAL, MONEY_DIGITS, OrderBatch, money_to_int, rate_to_int
 from .models import (
     OrderTaxRecord,
     StateTaxRate,
@@ -12,39 +21,148 @@ from .models import (
 )
 
 
-# CSV Validation
-def validate_csv(file):
+REQUIRED_COLUMNS = ["timestamp", "latitude", "longitude", "subtotal"]
+NUMERIC_COLUMNS = ["latitude", "longitude", "subtotal"]
+
+# Valid coordinate ranges, in degrees
+COORDINATE_LIMITS = {"latitude": 90, "longitude": 180}
+
+# Row errors returned to the client are capped, the total count is always reported
+MAX_REPORTED_ERRORS = 1000
+
+
+# CSV reading
+def read_orders_csv(file):
     """
-     Quick check of CSV file:
-    - all necessary fields are there
-    - dates in the 'timestamp' column in ISO 8601 format
-    - subtotal, latitude, longitude are not empty and numeric
+    Reads the CSV into a DataFrame and checks file-level problems
+    (unreadable file, missing columns).
+    Returns (df, errors); df is None if the file cannot be used at all.
     """
-    required_columns = ["timestamp", "latitude", "longitude", "subtotal"]
-    # Attempt to read CSV
     try:
         df = pd.read_csv(file)
     except Exception as e:
-        return [f"Cannot read CSV: {e}"]
-    # Checking the mandatory columns
-    missing_cols = [col for col in required_columns if col not in df.columns]
+        return None, [f"Cannot read CSV: {e}"]
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
     if missing_cols:
-        return [f"Missing required columns: {', '.join(missing_cols)}"]
-    # Check for empty values
-    if df[required_columns].isna().any().any():
-        return ["CSV contains empty values in required columns"]
-    # Checking the date format
-    try:
-        # Allow microseconds, but errors will be caught
-        pd.to_datetime(df["timestamp"], errors="raise", utc=True)
-    except Exception:
-        return ["CSV contains invalid timestamps in 'timestamp' column"]
-    # Checking data types for numbers
-    for col in ["latitude", "longitude", "subtotal"]:
-        if not pd.api.types.is_numeric_dtype(df[col]):
-            return [f'Column "latitude", "longitude", "subtotal" must contain only numbers']
-    # If there are no errors, return an empty list
-    return []
+        return None, [f"Missing required columns: {', '.join(missing_cols)}"]
+    return df, []
+
+
+# Row validation
+def validate_rows(df):
+    """
+    Vectorized per-row check of the orders DataFrame.
+    Errors (the row cannot be imported):
+    - required values are empty
+    - 'timestamp' is not in ISO 8601 format
+    - latitude, longitude, subtotal are not numeric or not finite (inf)
+    - latitude is outside [-90, 90], longitude is outside [-180, 180]
+    - subtotal does not fit the subtotal column (12 digits, 2 decimal places)
+    Warnings (the row is imported without a county, as before):
+    - the point lies outside every NY county
+
+    Converts the columns in place (timestamp -> UTC datetime, numbers -> float)
+    and stores the county of each point in df["county_code"], so the
+    DataFrame can be imported right away without a second county lookup.
+    Returns (valid_mask, report), where report is
+    {"error_count", "errors", "warning_count", "warnings"}; errors and
+    warnings are lists of {"row", "column", "reason"} dicts sorted by row
+    and capped at MAX_REPORTED_ERRORS. "row" is the line number in the
+    CSV file (the header is line 1).
+    """
+    checks = []  # (boolean mask of bad rows, column, reason)
+
+    empty = df[REQUIRED_COLUMNS].isna()
+    for col in REQUIRED_COLUMNS:
+        checks.append((empty[col].to_numpy(), col, "empty value"))
+
+    df["timestamp"] = pd.to_datetime(
+        df["timestamp"], errors="coerce", utc=True, format="ISO8601")
+    checks.append((
+        (df["timestamp"].isna() & ~empty["timestamp"]).to_numpy(),
+        "timestamp", "invalid ISO 8601 timestamp",
+    ))
+
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+        checks.append((
+            (df[col].isna() & ~empty[col]).to_numpy(), col, "not a number",
+        ))
+        checks.append((np.isinf(df[col].to_numpy(dtype=np.float64)), col, "not a finite number"))
+
+    # Range checks; NaN and inf are already reported above and compare as False here
+    lats = df["latitude"].to_numpy(dtype=np.float64)
+    lons = df["longitude"].to_numpy(dtype=np.float64)
+    for col, values in [("latitude", lats), ("longitude", lons)]:
+        limit = COORDINATE_LIMITS[col]
+        checks.append((
+            np.isfinite(values) & (np.abs(values) > limit),
+            col, f"out of range, must be between -{limit} and {limit}",
+        ))
+    subtotals = df["subtotal"].to_numpy(dtype=np.float64)
+    # Values from MAX_SUBTOTAL - 0.005 up are rounded to MAX_SUBTOTAL (money_to_int)
+    checks.append((
+        np.isfinite(subtotals)
+        & (np.abs(subtotals) >= MAX_SUBTOTAL - 0.5 * 10 ** -MONEY_DIGITS),
+        "subtotal", f"out of range, must be less than {MAX_SUBTOTAL} in absolute value",
+    ))
+
+    # Only rows with usable coordinates go through the county lookup
+    has_point = np.isfinite(lats) & np.isfinite(lons)
+    county_codes = np.full(len(df), -1, dtype=np.int32)
+    county_codes[has_point] = locate_points(
+        COUNTIES_TREE,
+        lats[has_point],
+        lons[has_point],
+    )
+    df["county_code"] = county_codes
+    outside = has_point & (county_codes < 0)
+
+    invalid = np.zeros(len(df), dtype=bool)
+    for mask, _, _ in checks:
+        invalid |= mask
+
+    errors, error_count = _row_report(checks)
+    warnings, warning_count = _row_report([
+        (outside & ~invalid, "latitude,longitude", "point is outside every NY county"),
+    ])
+    return ~invalid, {
+        "error_count": error_count,
+        "errors": errors,
+        "warning_count": warning_count,
+        "warnings": warnings,
+    }
+
+
+def _row_report(checks):
+    """
+    Turns (mask, column, reason) checks into ({"row", "column", "reason"} list, total).
+    Dicts are built only for the reported entries, not for every bad row.
+    """
+    if not checks:
+        return [], 0
+    rows = np.concatenate([np.flatnonzero(mask) for mask, _, _ in checks])
+    check_ids = np.concatenate([
+        np.full(np.count_nonzero(mask), i) for i, (mask, _, _) in enumerate(checks)
+    ])
+    order = np.lexsort((check_ids, rows))[:MAX_REPORTED_ERRORS]
+    report = [
+        {
+            "row": int(rows[i]) + 2,
+            "column": checks[check_ids[i]][1],
+            "reason": checks[check_ids[i]][2],
+        }
+        for i in order
+    ]
+    return report, len(rows)
+
+
+# Bounded pool for CPU-bound geo lookups made from async views,
+# so point-in-polygon checks do not block the event loop
+GEO_EXECUTOR = ThreadPoolExecutor(
+    max_workers=settings.GEO_EXECUTOR_WORKERS,
+    thread_name_prefix="geo",
+)
 
 
 # Geo functions for searching the county and city by point:
@@ -69,6 +187,48 @@ def find_city(lat, lon):
     return None
 
 
+def locate_points(tree, lats, lons):
+    """
+    Vectorized version of the lookups above: one STRtree query for all points.
+    Returns an array with the index of the first polygon covering each point
+    (same order as COUNTIES/CITIES), or -1 if no polygon covers it.
+    """
+    points = shapely.points(lons, lats)
+    point_idx, polygon_idx = tree.query(points, predicate="covered_by")
+    result = np.full(len(points), -1, dtype=np.intp)
+    # np.unique returns the first occurrence, like the loops in find_county()/find_city()
+    matched, first = np.unique(point_idx, return_index=True)
+    result[matched] = polygon_idx[first]
+    return result
+
+
+# Loading tax rates from the database
+def load_tax_rates():
+    """
+    Returns (state_rate, county_rates, city_rates, special_rates),
+    where the last three are dicts keyed by jurisdiction name.
+    """
+    state_rate = StateTaxRate.objects.get(state_name="NY").state_rate
+    county_rates = {
+        c.county_name: c.county_rate for c in CountyTaxRate.objects.all()}
+    city_rates = {c.city_name: c.city_rate for c in CityTaxRate.objects.all()}
+    special_rates = {
+        s.city_or_county_name: s.special_rate for s in SpecialTaxRate.objects.all()}
+    return state_rate, county_rates, city_rates, special_rates
+
+
+async def aload_tax_rates():
+    """Async version of load_tax_rates() for ASGI views."""
+    state_rate = (await StateTaxRate.objects.aget(state_name="NY")).state_rate
+    county_rates = {
+        c.county_name: c.county_rate async for c in CountyTaxRate.objects.all()}
+    city_rates = {
+        c.city_name: c.city_rate async for c in CityTaxRate.objects.all()}
+    special_rates = {
+        s.city_or_county_name: s.special_rate async for s in SpecialTaxRate.objects.all()}
+    return state_rate, county_rates, city_rates, special_rates
+
+
 # Creating an OrderTaxRecord object (without saving)
 def create_order_object(timestamp, lat, lon, subtotal,
                         state_rate, county_rates, city_rates, special_rates):
@@ -94,40 +254,86 @@ def create_order_object(timestamp, lat, lon, subtotal,
 def process_orders_csv(file):
     """
     Reads CSV and creates records in OrderTaxRecord.
-    Suitable for large files (11k+ points).
-    It is expected that the CSV file has already been validated via validate_csv()
-    For mass loading, we do bulk_create for optimization.
-    """
-    # Reading CSV into a DataFrame
-    df = pd.read_csv(file)
-    # Convert the timestamp column to datetime (UTC, with timezone)
-    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+    Raises ValueError if the file or any of its rows is invalid
+    (same rules as the strict mode of POST /orders/import).
+    Returns the number of imported orders.
+    """
+    df, errors = read_orders_csv(file)
+    if errors:
+        raise ValueError(errors[0])
+    _, report = validate_rows(df)
+    if report["errors"]:
+        raise ValueError(f"CSV contains {report['error_count']} invalid values, "
+                         f"first: {report['errors'][0]}")
+    return import_orders_df(df)
+
+
+def import_orders_df(df):
+    """
+    Creates records in OrderTaxRecord from a DataFrame prepared by validate_rows().
+    Suitable for large files (1M+ rows): rows are kept in a columnar
+    OrderBatch and written with bulk_create in batches.
+    Returns the number of imported orders.
+    """
     # Loading tax rates from the database once
-    state_rate = StateTaxRate.objects.get(state_name="NY").state_rate
-    county_rates = {
-        c.county_name: c.county_rate for c in CountyTaxRate.objects.all()}
-    city_rates = {c.city_name: c.city_rate for c in CityTaxRate.objects.all()}
-    special_rates = {
-        s.city_or_county_name: s.special_rate for s in SpecialTaxRate.objects.all()}
-    # Create objects for bulk_create.
-    # Important: call calculate_totals() before inserting, as bulk_create
-    # does not call save() and, accordingly, does not recalculate the sums automatically.
-    orders_to_create = []
-    for row in df.itertuples(index=False):
-        obj = create_order_object(
-            timestamp=row.timestamp,
-            lat=row.latitude,
-            lon=row.longitude,
-            subtotal=row.subtotal,
-            state_rate=state_rate,
-            county_rates=county_rates,
-            city_rates=city_rates,
-            special_rates=special_rates,
-        )
-        obj.calculate_totals()
-        orders_to_create.append(obj)
+    with profile_stage("load_rates"):
+        rates = load_tax_rates()
+    with profile_stage("build_batch"):
+        batch = build_order_batch(df, *rates)
     # Mass insertion
-    OrderTaxRecord.objects.bulk_create(orders_to_create)
+    with profile_stage("bulk_create"):
+        return batch.save()
+
+
+def build_order_batch(df, state_rate, county_rates, city_rates, special_rates):
+    """
+    Vectorized counterpart of create_order_object() + calculate_totals()
+    for a whole DataFrame. Jurisdictions are found with one STRtree query
+    per layer (counties are reused from validate_rows() when it already
+    looked them up), rates are looked up by county/city code.
+    """
+    lats = df["latitude"].to_numpy(dtype=np.float64)
+    lons = df["longitude"].to_numpy(dtype=np.float64)
+    if "county_code" in df.columns:
+        county_codes = df["county_code"].to_numpy(dtype=np.int32)
+    else:
+        county_codes = locate_points(COUNTIES_TREE, lats, lons).astype(np.int32)
+    city_codes = locate_points(CITIES_TREE, lats, lons).astype(np.int32)
+    county_names = [c["name"] for c in COUNTIES]
+    city_names = [c["name"] for c in CITIES]
+
+    # Rate tables indexed by code; the extra last entry is for code -1
+    # (no county/city), looked up under None like create_order_object() does
+    def rate_table(names, lookup):
+        return np.array(
+            [rate_to_int(lookup(name)) for name in names + [None]], dtype=np.int32)
+
+    county_rate = rate_table(county_names, lambda name: county_rates.get(name, 0))[county_codes]
+    city_rate = rate_table(city_names, lambda name: city_rates.get(name, 0))[city_codes]
+    # Special rate: by city if there is one for it, otherwise by county
+    missing = -1
+    special_by_city = rate_table(
+        city_names, lambda name: special_rates.get(name, missing))[city_codes]
+    special_by_county = rate_table(
+        county_names, lambda name: special_rates.get(name, 0))[county_codes]
+    special = np.where(
+        special_by_city == rate_to_int(missing), special_by_county, special_by_city)
+
+    return OrderBatch(
+        purchase_date=df["timestamp"].dt.tz_convert("UTC").dt.tz_localize(None).to_numpy(),
+        latitude=lats,
+        longitude=lons,
+        # Decimal(str(x)) of the old code, rounded half up to the column's cents
+        subtotal=money_to_int(df["subtotal"].to_numpy(dtype=np.float64)),
+        county_codes=county_codes,
+        city_codes=city_codes,
+        county_names=county_names,
+        city_names=city_names,
+        state_rate=np.full(len(df), rate_to_int(state_rate), dtype=np.int32),
+        county_rate=county_rate,
+        city_rate=city_rate,
+        special_rates=special.astype(np.int32),
+    )
 
 
 # Manual input
@@ -139,12 +345,7 @@ def process_manual_order(data):
     # Convert timestamp to datetime (UTC, with timezone)
     timestamp = pd.to_datetime(data["timestamp"], utc=True)
     # We read the rates once
-    state_rate = StateTaxRate.objects.get(state_name="NY").state_rate
-    county_rates = {
-        c.county_name: c.county_rate for c in CountyTaxRate.objects.all()}
-    city_rates = {c.city_name: c.city_rate for c in CityTaxRate.objects.all()}
-    special_rates = {
-        s.city_or_county_name: s.special_rate for s in SpecialTaxRate.objects.all()}
+    state_rate, county_rates, city_rates, special_rates = load_tax_rates()
     obj = create_order_object(
         timestamp=timestamp,
         lat=data["latitude"],
@@ -156,4 +357,30 @@ def process_manual_order(data):
         special_rates=special_rates,
     )
     obj.save()
-    return obj
\ No newline at end of file
+    return obj
+
+
+async def aprocess_manual_order(data):
+    """
+    Async version of process_manual_order() for ASGI views.
+    Geo lookups run in GEO_EXECUTOR, database access uses the async ORM.
+    """
+    timestamp = pd.to_datetime(data["timestamp"], utc=True)
+    state_rate, county_rates, city_rates, special_rates = await aload_tax_rates()
+    loop = asyncio.get_running_loop()
+    obj = await loop.run_in_executor(
+        GEO_EXECUTOR,
+        partial(
+            create_order_object,
+            timestamp=timestamp,
+            lat=data["latitude"],
+            lon=data["longitude"],
+            subtotal=data["subtotal"],
+            state_rate=state_rate,
+            county_rates=county_rates,
+            city_rates=city_rates,
+            special_rates=special_rates,
+        ),
+    )
+    await obj.asave()
+    return obj
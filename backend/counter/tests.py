@@ -1,3 +1,686 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import time
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+from unittest import mock, skipIf
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import JsonResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase
+from django.urls import reverse
+from shapely.geometry import box
+from shapely.strtree import STRtree
+
+from . import order_batch, profiling, serializers, services, views
+from .models import (
+    CityTaxRate,
+    CountyTaxRate,
+    OrderTaxRecord,
+    SpecialTaxRate,
+    StateTaxRate,
+)
+
+# Small synthetic geo layers, so the tests do not depend on the GeoJSON files.
+# box(min_lon, min_lat, max_lon, max_lat)
+TEST_COUNTIES = [
+    {"name": "Alpha", "polygon": box(-74.0, 40.0, -73.0, 41.0)},
+    {"name": "Beta", "polygon": box(-76.0, 42.0, -74.0, 43.0)},
+]
+TEST_CITIES = [
+    # Has its own special rate
+    {"name": "Alpha City", "polygon": box(-73.9, 40.2, -73.5, 40.6)},
+    # No special rate of its own, falls back to the county (Alpha)
+    {"name": "Alpha Town", "polygon": box(-73.4, 40.2, -73.1, 40.6)},
+    # No special rate, and its county (Beta) has none either
+    {"name": "Beta Village", "polygon": box(-75.5, 42.2, -75.0, 42.6)},
+]
+
+CSV_HEADER = "timestamp,latitude,longitude,subtotal\n"
+
+
+def csv_file(body, name="orders.csv"):
+    return SimpleUploadedFile(name, (CSV_HEADER + body).encode(), content_type="text/csv")
+
+
+def csv_frame(body):
+    df, errors = services.read_orders_csv(io.StringIO(CSV_HEADER + body))
+    assert not errors, errors
+    return df
+
+
+class GeoTestCase(TestCase):
+    """Replaces the county/city layers with TEST_COUNTIES / TEST_CITIES and loads test rates."""
+
+    def setUp(self):
+        patches = {
+            "COUNTIES": TEST_COUNTIES,
+            "COUNTIES_TREE": STRtree([c["polygon"] for c in TEST_COUNTIES]),
+            "CITIES": TEST_CITIES,
+            "CITIES_TREE": STRtree([c["polygon"] for c in TEST_CITIES]),
+        }
+        for name, value in patches.items():
+            patcher = mock.patch.object(services, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        StateTaxRate.objects.create(state_name="NY", state_rate=Decimal("0.04000"))
+        CountyTaxRate.objects.create(county_name="Alpha", county_rate=Decimal("0.04500"))
+        CountyTaxRate.objects.create(county_name="Beta", county_rate=Decimal("0.03000"))
+        CityTaxRate.objects.create(city_name="Alpha City", city_rate=Decimal("0.00500"))
+        SpecialTaxRate.objects.create(city_or_county_name="Alpha City", special_rate=Decimal("0.00375"))
+        SpecialTaxRate.objects.create(city_or_county_name="Alpha", special_rate=Decimal("0.00125"))
+        # Rows without a county/city are looked up under None
+        SpecialTaxRate.objects.create(city_or_county_name=None, special_rate=Decimal("0.00010"))
+
+
+class ValidateRowsTests(GeoTestCase):
+    def test_valid_rows_have_no_errors(self):
+        df = csv_frame(
+            "2025-11-04 10:17:04.915257,40.5,-73.7,10.00\n"
+            "2025-11-04T10:17:04+02:00,42.5,-75.2,20.50\n"
+        )
+        valid_mask, report = services.validate_rows(df)
+        self.assertTrue(valid_mask.all())
+        self.assertEqual(report["error_count"], 0)
+        self.assertEqual(report["errors"], [])
+        self.assertEqual(report["warnings"], [])
+        self.assertEqual(df["county_code"].tolist(), [0, 1])
+
+    def test_errors_have_csv_line_numbers_and_are_sorted(self):
+        df = csv_frame(
+            "2025-11-04 10:00:00,40.5,-73.7,10\n"   # line 2: valid
+            "2025-11-04 10:00:00,,-73.7,abc\n"      # line 3: empty latitude, bad subtotal
+            "not a date,40.5,-73.7,10\n"            # line 4: bad timestamp
+            ",40.5,x,\n"                            # line 5: empty ts, bad lon, empty subtotal
+        )
+        valid_mask, report = services.validate_rows(df)
+        self.assertEqual(valid_mask.tolist(), [True, False, False, False])
+        self.assertEqual(report["error_count"], 6)
+        self.assertEqual(
+            [(e["row"], e["column"], e["reason"]) for e in report["errors"]],
+            [
+                (3, "latitude", "empty value"),
+                (3, "subtotal", "not a number"),
+                (4, "timestamp", "invalid ISO 8601 timestamp"),
+                (5, "timestamp", "empty value"),
+                (5, "subtotal", "empty value"),
+                (5, "longitude", "not a number"),
+            ],
+        )
+
+    def test_outside_county_is_a_warning(self):
+        df = csv_frame(
+            "2025-11-04 10:00:00,10,10,5\n"
+            "2025-11-04 10:00:00,,10,5\n"
+        )
+        valid_mask, report = services.validate_rows(df)
+        # Only the row with a point is checked, the other one is an error
+        self.assertEqual(valid_mask.tolist(), [True, False])
+        self.assertEqual(report["warning_count"], 1)
+        self.assertEqual(report["warnings"], [{
+            "row": 2,
+            "column": "latitude,longitude",
+            "reason": "point is outside every NY county",
+        }])
+
+    def test_non_finite_numbers_are_errors(self):
+        df = csv_frame(
+            "2025-11-04 10:00:00,inf,-73.7,10\n"
+            "2025-11-04 10:00:00,40.5,-inf,10\n"
+            "2025-11-04 10:00:00,40.5,-73.7,Infinity\n"
+            "2025-11-04 10:00:00,40.5,-73.7,10\n"
+        )
+        valid_mask, report = services.validate_rows(df)
+        self.assertEqual(valid_mask.tolist(), [False, False, False, True])
+        self.assertEqual(
+            [(e["row"], e["column"], e["reason"]) for e in report["errors"]],
+            [
+                (2, "latitude", "not a finite number"),
+                (3, "longitude", "not a finite number"),
+                (4, "subtotal", "not a finite number"),
+            ],
+        )
+        # Rows without a usable point are not checked against the counties
+        self.assertEqual(report["warnings"], [])
+        self.assertEqual(df["county_code"].tolist(), [-1, -1, 0, 0])
+
+    def test_coordinates_out_of_range_are_errors(self):
+        df = csv_frame(
+            "2025-11-04 10:00:00,90,180,10\n"       # line 2: on the limits, valid
+            "2025-11-04 10:00:00,-90,-180,10\n"     # line 3: on the limits, valid
+            "2025-11-04 10:00:00,90.5,-73.7,10\n"   # line 4
+            "2025-11-04 10:00:00,-91,-73.7,10\n"    # line 5
+            "2025-11-04 10:00:00,40.5,180.1,10\n"   # line 6
+            "2025-11-04 10:00:00,40.5,-200,10\n"    # line 7
+        )
+        valid_mask, report = services.validate_rows(df)
+        self.assertEqual(valid_mask.tolist(), [True, True, False, False, False, False])
+        self.assertEqual(
+            [(e["row"], e["column"], e["reason"]) for e in report["errors"]],
+            [
+                (4, "latitude", "out of range, must be between -90 and 90"),
+                (5, "latitude", "out of range, must be between -90 and 90"),
+                (6, "longitude", "out of range, must be between -180 and 180"),
+                (7, "longitude", "out of range, must be between -180 and 180"),
+            ],
+        )
+        # Out-of-range points get an error, not an outside-county warning
+        self.assertEqual([w["row"] for w in report["warnings"]], [2, 3])
+
+    def test_subtotal_must_fit_the_decimal_field(self):
+        df = csv_frame(
+            "2025-11-04 10:00:00,40.5,-73.7,9999999999.99\n"    # line 2: largest value
+            "2025-11-04 10:00:00,40.5,-73.7,-9999999999.99\n"   # line 3
+            "2025-11-04 10:00:00,40.5,-73.7,9999999999.999\n"   # line 4: rounds to 1e10
+            "2025-11-04 10:00:00,40.5,-73.7,1e20\n"             # line 5
+            "2025-11-04 10:00:00,40.5,-73.7,-1e10\n"            # line 6
+        )
+        valid_mask, report = services.validate_rows(df)
+        self.assertEqual(valid_mask.tolist(), [True, True, False, False, False])
+        reason = "out of range, must be less than 10000000000 in absolute value"
+        self.assertEqual(
+            [(e["row"], e["column"], e["reason"]) for e in report["errors"]],
+            [(4, "subtotal", reason), (5, "subtotal", reason), (6, "subtotal", reason)],
+        )
+
+    def test_report_is_capped(self):
+        # Two errors per row
+        rows = "".join("bad,40.5,-73.7,x\n" for _ in range(services.MAX_REPORTED_ERRORS))
+        _, report = services.validate_rows(csv_frame(rows))
+        self.assertEqual(report["error_count"], 2 * services.MAX_REPORTED_ERRORS)
+        self.assertEqual(len(report["errors"]), services.MAX_REPORTED_ERRORS)
+        self.assertEqual(report["errors"][-1]["row"], services.MAX_REPORTED_ERRORS // 2 + 1)
+
+    def test_header_only_file(self):
+        valid_mask, report = services.validate_rows(csv_frame(""))
+        self.assertEqual(len(valid_mask), 0)
+        self.assertEqual(report["error_count"], 0)
+
+    def test_all_rows_invalid(self):
+        df = csv_frame("bad,x,y,z\nbad,x,y,z\n")
+        valid_mask, report = services.validate_rows(df)
+        self.assertFalse(valid_mask.any())
+        self.assertEqual(report["error_count"], 8)
+
+    def test_file_level_errors(self):
+        df, errors = services.read_orders_csv(io.StringIO(""))
+        self.assertIsNone(df)
+        self.assertTrue(errors[0].startswith("Cannot read CSV"))
+        df, errors = services.read_orders_csv(io.StringIO("timestamp,latitude\n"))
+        self.assertIsNone(df)
+        self.assertEqual(errors, ["Missing required columns: longitude, subtotal"])
+
+    def test_process_orders_csv_rejects_invalid_rows(self):
+        with self.assertRaises(ValueError):
+            services.process_orders_csv(io.StringIO(CSV_HEADER + "bad,40.5,-73.7,10\n"))
+        self.assertEqual(OrderTaxRecord.objects.count(), 0)
+
+
+class ImportOrdersApiTests(GeoTestCase):
+    url = reverse("orders_import")
+    body = (
+        "2025-11-04 10:00:00,40.5,-73.7,10\n"   # line 2: valid
+        "not a date,40.5,-73.7,10\n"            # line 3: error
+        "2025-11-04 10:00:00,10,10,5\n"         # line 4: outside every county
+    )
+
+    def test_strict_mode_rejects_file_with_errors(self):
+        response = self.client.post(self.url, {"orders_file": csv_file(self.body)})
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertEqual(data["error_count"], 1)
+        self.assertEqual(data["errors"][0]["row"], 3)
+        self.assertEqual(OrderTaxRecord.objects.count(), 0)
+
+    def test_strict_mode_imports_out_of_county_rows(self):
+        body = "2025-11-04 10:00:00,40.5,-73.7,10\n2025-11-04 10:00:00,10,10,5\n"
+        response = self.client.post(self.url, {"orders_file": csv_file(body)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["warning_count"], 1)
+        self.assertEqual(OrderTaxRecord.objects.count(), 2)
+        self.assertEqual(OrderTaxRecord.objects.filter(county_name__isnull=True).count(), 1)
+
+    def test_partial_mode_imports_valid_rows(self):
+        response = self.client.post(
+            self.url + "?mode=partial", {"orders_file": csv_file(self.body)})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["imported"], data["rejected"]), (2, 1))
+        self.assertEqual([e["row"] for e in data["errors"]], [3])
+        self.assertEqual([w["row"] for w in data["warnings"]], [4])
+        self.assertEqual(OrderTaxRecord.objects.count(), 2)
+
+    def test_mode_from_form_field(self):
+        response = self.client.post(
+            self.url, {"orders_file": csv_file(self.body), "mode": "partial"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_mode(self):
+        response = self.client.post(
+            self.url + "?mode=all", {"orders_file": csv_file(self.body)})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unreadable_file(self):
+        response = self.client.post(
+            self.url, {"orders_file": SimpleUploadedFile("orders.csv", b"")})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()["errors"][0].startswith("Cannot read CSV"))
+
+
+class OrderBatchTests(GeoTestCase):
+    fields = [
+        "purchase_date", "latitude", "longitude", "subtotal",
+        "state_name", "county_name", "city_name",
+        "state_rate", "county_rate", "city_rate", "special_rates",
+        "composite_tax_rate", "tax_amount", "total_amount",
+    ]
+
+    def build(self, body):
+        df = csv_frame(body)
+        valid_mask, _ = services.validate_rows(df)
+        df = df[valid_mask]
+        rates = services.load_tax_rates()
+        return df, rates, services.build_order_batch(df, *rates)
+
+    def test_matches_per_row_calculation(self):
+        rng = np.random.default_rng(7)
+        n = 2000
+        df = pd.DataFrame({
+            "timestamp": "2025-11-04 10:17:04.915257",
+            "latitude": rng.uniform(39.8, 43.2, n).round(6),
+            "longitude": rng.uniform(-76.2, -72.8, n).round(6),
+            "subtotal": rng.uniform(0.01, 5000, n).round(2),
+        })
+        df, rates, batch = self.build(df.to_csv(index=False).split("\n", 1)[1])
+        objs = list(batch.iter_objects(0, len(batch)))
+        self.assertEqual(len(objs), n)
+        for row, obj in zip(df.itertuples(index=False), objs):
+            expected = services.create_order_object(
+                row.timestamp, row.latitude, row.longitude, row.subtotal, *rates)
+            expected.calculate_totals()
+            for field in self.fields:
+                self.assertEqual(getattr(obj, field), getattr(expected, field), field)
+
+    def test_special_rate_fallback(self):
+        _, _, batch = self.build(
+            "2025-11-04 10:00:00,40.4,-73.7,100\n"   # Alpha City: own special rate
+            "2025-11-04 10:00:00,40.4,-73.2,100\n"   # Alpha Town: falls back to county Alpha
+            "2025-11-04 10:00:00,40.8,-73.2,100\n"   # Alpha, no city: the None entry wins
+            "2025-11-04 10:00:00,42.4,-75.2,100\n"   # Beta Village, Beta: no special rate
+            "2025-11-04 10:00:00,10,10,100\n"        # no county/city: the None entry
+        )
+        # Same rule as create_order_object():
+        # special_rates.get(city, special_rates.get(county, 0))
+        self.assertEqual(batch.special_rates.tolist(), [375, 125, 10, 0, 10])
+        self.assertEqual(batch.county_codes.tolist(), [0, 0, 0, 1, -1])
+        self.assertEqual(batch.city_codes.tolist(), [0, 1, -1, 2, -1])
+
+    def test_integer_totals(self):
+        _, _, batch = self.build("2025-11-04 10:00:00,40.4,-73.7,10.00\n")
+        obj = next(batch.iter_objects(0, 1))
+        # 0.04 + 0.045 + 0.005 + 0.00375
+        self.assertEqual(obj.composite_tax_rate, Decimal("0.09375"))
+        self.assertEqual(obj.tax_amount, Decimal("0.9375000"))
+        self.assertEqual(obj.total_amount, Decimal("10.9375000"))
+
+    def test_sub_cent_subtotals_are_rounded_half_up(self):
+        values = [1.005, 0.125, -0.125, 2.675, 0.005, 1.0049999, 10.0, 9999999999.99]
+        self.assertEqual(
+            order_batch.money_to_int(values).tolist(),
+            [101, 13, -13, 268, 1, 100, 1000, 999999999999],
+        )
+        # Same as rounding the old Decimal(str(x)), for any number of decimal places
+        rng = np.random.default_rng(11)
+        for digits in [3, 4, 6]:
+            values = rng.uniform(-1000, 1000, 5000).round(digits)
+            expected = [
+                int(Decimal(str(v)).quantize(Decimal("0.01"), ROUND_HALF_UP).scaleb(2))
+                for v in values.tolist()
+            ]
+            self.assertEqual(order_batch.money_to_int(values).tolist(), expected)
+
+    def test_tax_is_computed_from_the_rounded_subtotal(self):
+        _, _, batch = self.build(
+            "2025-11-04 10:00:00,40.4,-73.7,1.005\n"
+            "2025-11-04 10:00:00,40.4,-73.7,0.125\n"
+        )
+        first, second = batch.iter_objects(0, 2)
+        self.assertEqual(first.subtotal, Decimal("1.01"))
+        self.assertEqual(first.tax_amount, Decimal("0.0946875"))   # 1.01 * 0.09375
+        self.assertEqual(first.total_amount, Decimal("1.1046875"))
+        self.assertEqual(second.subtotal, Decimal("0.13"))
+        self.assertEqual(second.tax_amount, Decimal("0.0121875"))
+
+    def test_non_finite_and_huge_subtotals_are_rejected(self):
+        for value in [np.inf, -np.inf, np.nan, 1e20, -1e10, 9999999999.995]:
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    order_batch.money_to_int([10.0, value])
+        df = csv_frame("2025-11-04 10:00:00,40.4,-73.7,1e20\n")
+        df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+        with self.assertRaises(ValueError):
+            services.build_order_batch(df, *services.load_tax_rates())
+
+    def test_save_writes_all_rows_in_batches(self):
+        body = "".join(
+            f"2025-11-04 10:00:{i % 60:02d},40.4,-73.7,{i + 1}.25\n" for i in range(25))
+        _, _, batch = self.build(body)
+        self.assertEqual(batch.save(batch_size=10), 25)
+        self.assertEqual(OrderTaxRecord.objects.count(), 25)
+        order = OrderTaxRecord.objects.get(subtotal=Decimal("1.25"))
+        self.assertEqual(order.city_name, "Alpha City")
+        self.assertEqual(order.tax_amount, Decimal("0.12"))
+        self.assertEqual(order.total_amount, Decimal("1.37"))
+
+
+class SpatialFilterTests(TestCase):
+    url = reverse("list_orders_api")
+    # (name, lat, lon); distances from (40.0, -74.0): 0, ~3.3 km, ~11.1 km, ~8.5 km
+    points = [
+        ("center", 40.0, -74.0),
+        ("near", 40.03, -74.0),
+        ("far", 40.1, -74.0),
+        ("east", 40.0, -73.9),
+    ]
+
+    def setUp(self):
+        for name, lat, lon in self.points:
+            OrderTaxRecord.objects.create(
+                purchase_date="2025-11-04T10:00:00Z",
+                latitude=lat,
+                longitude=lon,
+                subtotal=Decimal("10.00"),
+                state_name="NY",
+                city_name=name,
+            )
+
+    def cities(self, query):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        return sorted(row["city"] for row in response.json()["results"])
+
+    def test_bbox(self):
+        self.assertEqual(
+            self.cities("?bbox=-74.05,39.95,-73.95,40.05"), ["center", "near"])
+        self.assertEqual(
+            self.cities("?bbox=-74.05,39.95,-73.85,40.2"), ["center", "east", "far", "near"])
+
+    def test_near_radius(self):
+        self.assertEqual(self.cities("?near=40.0,-74.0&radius_km=5"), ["center", "near"])
+        self.assertEqual(
+            self.cities("?near=40.0,-74.0&radius_km=10"), ["center", "east", "near"])
+        self.assertEqual(
+            self.cities("?near=40.0,-74.0&radius_km=12"), ["center", "east", "far", "near"])
+
+    def test_near_is_exact_not_only_bounding_box(self):
+        # (40.03, -73.965) is inside the bounding box of the 4 km circle but
+        # ~4.5 km from the center, so only the haversine check excludes it
+        OrderTaxRecord.objects.create(
+            purchase_date="2025-11-04T10:00:00Z", latitude=40.03, longitude=-73.965,
+            subtotal=Decimal("10.00"), state_name="NY", city_name="corner",
+        )
+        self.assertEqual(self.cities("?near=40.0,-74.0&radius_km=4"), ["center", "near"])
+
+    def test_radius_around_the_whole_earth(self):
+        # An almost antipodal point: the haversine term is 1.0000000000000002
+        # here, asin() of values above 1 is an error on PostgreSQL
+        OrderTaxRecord.objects.create(
+            purchase_date="2025-11-04T10:00:00Z", latitude=-40.000000228, longitude=106.0,
+            subtotal=Decimal("10.00"), state_name="NY", city_name="antipode",
+        )
+        everything = ["antipode", "center", "east", "far", "near"]
+        for radius_km in ["20016", "40000", "1e9"]:
+            with self.subTest(radius_km=radius_km):
+                self.assertEqual(
+                    self.cities(f"?near=40.0,-74.0&radius_km={radius_km}"), everything)
+        self.assertEqual(self.cities("?near=-40.000000228,106.0&radius_km=1"), ["antipode"])
+
+    def test_malformed_parameters_are_ignored(self):
+        everything = ["center", "east", "far", "near"]
+        for query in [
+            "?bbox=1,2,3",
+            "?bbox=a,b,c,d",
+            "?bbox=nan,0,1,1",
+            "?near=40.0&radius_km=5",
+            "?near=40.0,-74.0",
+            "?near=40.0,-74.0&radius_km=abc",
+            "?near=40.0,-74.0&radius_km=-1",
+            "?near=inf,-74.0&radius_km=5",
+        ]:
+            with self.subTest(query=query):
+                self.assertEqual(self.cities(query), everything)
+
+
+class ProfilingTests(TestCase):
+    url = reverse("list_orders_api")
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.profile_dir = Path(tmp.name)
+        overrides = self.settings(PROFILE_DIR=tmp.name, PROFILE_KEEP=2)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        staff = User.objects.create_user("staff", password="x", is_staff=True)
+        self.client.force_login(staff)
+
+    def test_only_known_flags_enable_profiling(self):
+        for flag in ["1", "true", "TRUE", "sample"]:
+            with self.subTest(flag=flag):
+                response = self.client.get(self.url, {"profile": flag})
+                self.assertIn("X-Profile-Id", response)
+        for flag in ["0", "false", "no"]:
+            with self.subTest(flag=flag):
+                response = self.client.get(self.url, headers={"X-Profile": flag})
+                self.assertNotIn("X-Profile-Id", response)
+
+    def test_non_staff_requests_are_not_profiled(self):
+        self.client.logout()
+        response = self.client.get(self.url, {"profile": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile-Id", response)
+
+    def test_concurrent_profile_is_rejected(self):
+        with profiling._profile_lock:
+            response = self.client.get(self.url, {"profile": "1"})
+        self.assertEqual(response.status_code, 409)
+        # Unprofiled requests are not affected by the lock
+        with profiling._profile_lock:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_download_and_retention(self):
+        ids = []
+        for _ in range(3):
+            ids.append(self.client.get(self.url, {"profile": "1"})["X-Profile-Id"])
+            time.sleep(0.01)
+        # PROFILE_KEEP=2: the oldest profile is deleted
+        self.assertEqual(
+            sorted(p.stem for p in self.profile_dir.glob("*.json")), sorted(ids[1:]))
+        summary = self.client.get(
+            reverse("profile_download_api", args=[ids[-1]]), {"summary": "1"})
+        self.assertEqual(json.loads(summary.getvalue())["id"], ids[-1])
+        self.assertEqual(
+            self.client.get(reverse("profile_download_api", args=[ids[0]])).status_code, 404)
+
+
+def legacy_list_row(order):
+    """The list row exactly as list_orders_api built it before values_list/serialize_order_rows."""
+    return {
+        "id": str(order.id),
+        "latitude": float(order.latitude),
+        "longitude": float(order.longitude),
+        "subtotal": float(order.subtotal),
+        "composite_tax_rate": float(order.composite_tax_rate),
+        "tax_amount": float(order.tax_amount),
+        "total_amount": float(order.total_amount),
+        "timestamp": order.purchase_date.astimezone(dt_timezone.utc)
+        .replace(microsecond=0)
+        .strftime("%Y-%m-%d %H:%M:%S"),
+        "state_rate": float(order.state_rate),
+        "county_rate": float(order.county_rate),
+        "city_rate": float(order.city_rate),
+        "special_rates": float(order.special_rates),
+        "state": order.state_name,
+        "county": order.county_name or "",
+        "city": order.city_name or "",
+    }
+
+
+class ListSerializationTests(TestCase):
+    url = reverse("list_orders_api")
+
+    def setUp(self):
+        OrderTaxRecord.objects.create(
+            purchase_date=datetime(2025, 11, 4, 13, 17, 4, 915257,
+                                   tzinfo=dt_timezone(timedelta(hours=3))),
+            latitude=40.712776,
+            longitude=-74.005974,
+            subtotal=Decimal("123.45"),
+            state_name="NY",
+            county_name="Montréal",
+            city_name="Ñandú Łódź",
+            state_rate=Decimal("0.04000"),
+            county_rate=Decimal("0.00001"),
+            city_rate=Decimal("0.00000"),
+            special_rates=Decimal("0.00375"),
+        )
+        # A row without county/city
+        OrderTaxRecord.objects.create(
+            purchase_date=datetime(2025, 11, 3, tzinfo=dt_timezone.utc),
+            latitude=41.0, longitude=-73.0, subtotal=Decimal("0.01"), state_name="NY",
+        )
+
+    def test_response_is_byte_for_byte_the_same_as_before(self):
+        orders = OrderTaxRecord.objects.order_by("-purchase_date")
+        expected = JsonResponse({
+            "count": 2,
+            "num_pages": 1,
+            "current_page": 1,
+            "results": [legacy_list_row(order) for order in orders],
+        })
+        response = self.client.get(self.url)
+        self.assertEqual(response["Content-Type"], expected["Content-Type"])
+        self.assertEqual(response.content, expected.content)
+        self.assertIn(b'"county_rate": 1e-05', response.content)
+        self.assertIn(b"Montr\\u00e9al", response.content)
+
+    @skipIf(serializers.orjson is None, "orjson is not installed")
+    def test_orjson_output_is_semantically_equal(self):
+        default = self.client.get(self.url)
+        with self.settings(ORJSON_RESPONSES=True):
+            fast = self.client.get(self.url)
+        self.assertNotEqual(fast.content, default.content)
+        self.assertEqual(json.loads(fast.content), json.loads(default.content))
+
+    def test_parse_page_size(self):
+        cases = {
+            None: 20, "abc": 20, "": 20, "1.5": 20,
+            "0": 1, "-5": 1, "1": 1, "50": 50, "1000": 1000, "5000": 1000,
+        }
+        for raw, expected in cases.items():
+            with self.subTest(raw=raw):
+                self.assertEqual(serializers.parse_page_size(raw), expected)
+
+    def test_page_size_is_capped_in_the_view(self):
+        for raw, expected_pages in [("abc", 1), ("0", 2), ("-5", 2), ("5000", 1)]:
+            with self.subTest(page_size=raw):
+                response = self.client.get(self.url, {"page_size": raw})
+                self.assertEqual(response.json()["num_pages"], expected_pages)
+
+    def test_format_timestamp_matches_strftime(self):
+        for dt in [
+            datetime(2025, 11, 4, 1, 2, 3, 999999, tzinfo=dt_timezone(timedelta(hours=5, minutes=30))),
+            datetime(2025, 12, 31, 22, 0, 0, tzinfo=dt_timezone(timedelta(hours=-4))),
+            datetime(2026, 1, 1, 0, 0, 0, 1, tzinfo=dt_timezone.utc),
+        ]:
+            with self.subTest(dt=dt):
+                self.assertEqual(
+                    serializers.format_timestamp(dt),
+                    dt.astimezone(dt_timezone.utc).replace(microsecond=0)
+                    .strftime("%Y-%m-%d %H:%M:%S"),
+                )
+
+
+class AsyncViewTests(GeoTestCase):
+    """The async views (ASYNC_VIEWS=True) must answer exactly like the sync ones."""
+
+    list_url = reverse("list_orders_api")
+    create_url = reverse("create_order_api")
+
+    async def get_both(self, params):
+        sync_response = await sync_to_async(views.list_orders_api)(
+            RequestFactory().get(self.list_url, params))
+        async_response = await views.list_orders_api_async(
+            AsyncRequestFactory().get(self.list_url, params))
+        return sync_response, async_response
+
+    async def test_list_matches_sync_view(self):
+        for day in range(1, 6):
+            await OrderTaxRecord.objects.acreate(
+                purchase_date=datetime(2025, 11, day, tzinfo=dt_timezone.utc),
+                latitude=40.5, longitude=-73.7, subtotal=Decimal("10.00"), state_name="NY",
+            )
+        for page in ["1", "2", "3", "0", "-1", "99", "x", "1.0", ""]:
+            with self.subTest(page=page):
+                sync_response, async_response = await self.get_both(
+                    {"page": page, "page_size": 2})
+                self.assertEqual(async_response.status_code, sync_response.status_code)
+                self.assertEqual(async_response.content, sync_response.content)
+
+    async def test_list_of_empty_table_has_one_page(self):
+        for page in ["1", "0", "99"]:
+            with self.subTest(page=page):
+                sync_response, async_response = await self.get_both({"page": page})
+                self.assertEqual(async_response.content, sync_response.content)
+                self.assertEqual(
+                    json.loads(async_response.content),
+                    {"count": 0, "num_pages": 1, "current_page": 1, "results": []},
+                )
+
+    async def test_create_matches_sync_view(self):
+        body = json.dumps({
+            "timestamp": "2025-11-04T10:17:04.915257+02:00",
+            "latitude": 40.5,
+            "longitude": -73.7,
+            "subtotal": 19.99,
+        })
+        sync_response = await sync_to_async(views.create_order_api)(
+            RequestFactory().post(self.create_url, body, content_type="application/json"))
+        async_response = await views.create_order_api_async(
+            AsyncRequestFactory().post(self.create_url, body, content_type="application/json"))
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+
+        sync_data = json.loads(sync_response.content)
+        async_data = json.loads(async_response.content)
+        self.assertNotEqual(async_data.pop("id"), sync_data.pop("id"))
+        self.assertEqual(async_data, sync_data)
+
+        fields = [
+            f.name for f in OrderTaxRecord._meta.fields
+            if f.name != "id" and not getattr(f, "auto_now_add", False)
+        ]
+        created = [row async for row in OrderTaxRecord.objects.order_by("id").values(*fields)]
+        self.assertEqual(len(created), 2)
+        self.assertEqual(created[0], created[1])
+        self.assertEqual(created[0]["county_name"], "Alpha")
+        self.assertEqual(created[0]["city_name"], "Alpha City")
+
+    async def test_create_rejects_invalid_json_like_sync_view(self):
+        for method, body in [("post", "{not json"), ("get", None)]:
+            with self.subTest(method=method):
+                sync_request = getattr(RequestFactory(), method)(
+                    self.create_url, body, content_type="application/json")
+                async_request = getattr(AsyncRequestFactory(), method)(
+                    self.create_url, body, content_type="application/json")
+                sync_response = await sync_to_async(views.create_order_api)(sync_request)
+                async_response = await views.create_order_api_async(async_request)
+                self.assertEqual(async_response.status_code, sync_response.status_code)
+                self.assertEqual(async_response.content, sync_response.content)
@@ -1,8 +1,17 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if settings.ASYNC_VIEWS:
+    create_order_view = views.create_order_api_async
+    list_orders_view = views.list_orders_api_async
+else:
+    create_order_view = views.create_order_api
+    list_orders_view = views.list_orders_api
+
 urlpatterns = [
     path('orders/import', views.import_orders_api, name='orders_import'),
-    path('orders', views.create_order_api, name='create_order_api'),
-    path('orders/list', views.list_orders_api, name='list_orders_api'),
+    path('orders', create_order_view, name='create_order_api'),
+    path('orders/list', list_orders_view, name='list_orders_api'),
+    path('orders/profiles/<str:profile_id>', views.profile_download_api, name='profile_download_api'),
 ]
\ No newline at end of file
@@ -1,36 +1,76 @@
 import json
+import math
+import re
 from decimal import Decimal, InvalidOperation
 
 from django.core.paginator import Paginator
-from django.db.models import Q
-from django.http import JsonResponse
+from django.db.models import ExpressionWrapper, F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+from django.http import FileResponse, JsonResponse
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
-from datetime import timezone as dt_timezone
 from django.views.decorators.csrf import csrf_exempt
 
-from .services import process_orders_csv, validate_csv, process_manual_order
+from .services import (
+    aprocess_manual_order,
+    import_orders_df,
+    process_manual_order,
+    read_orders_csv,
+    validate_rows,
+)
 from .models import OrderTaxRecord
+from .profiling import profile_dir, profile_stage, profiled
+from .serializers import (
+    ORDER_LIST_FIELDS,
+    fast_json_response,
+    format_timestamp,
+    parse_page_size,
+    serialize_order_rows,
+)
+
+
+# Mean Earth radius used for haversine distances
+EARTH_RADIUS_KM = 6371.0088
 
 
 # POST /orders/import
+# mode=strict (default): any invalid row rejects the whole file
+# mode=partial: valid rows are imported, invalid ones are reported back
 @csrf_exempt
+@profiled
 def import_orders_api(request):
     if request.method != "POST":
         return JsonResponse({"error": "Method not allowed"}, status=405)
     file = request.FILES.get("orders_file")
     if not file:
         return JsonResponse({"error": "No file uploaded"}, status=400)
+    mode = request.POST.get("mode") or request.GET.get("mode", "strict")
+    if mode not in ("strict", "partial"):
+        return JsonResponse({"error": "mode must be 'strict' or 'partial'"}, status=400)
     # CSV validation
-    errors = validate_csv(file)
+    with profile_stage("parse"):
+        df, errors = read_orders_csv(file)
     if errors:
-        # If there are errors, we return them and do not touch the database
         return JsonResponse({"errors": errors}, status=400)
-    # We rewind the file to the beginning before re-reading it in process_orders_csv
-    file.seek(0)
-    # If there are no errors, we process the file
-    process_orders_csv(file)
-    return JsonResponse({"message": "Orders imported successfully!"})
+    with profile_stage("validate"):
+        valid_mask, report = validate_rows(df)
+    if report["errors"] and mode == "strict":
+        # If there are errors, we return them and do not touch the database
+        return JsonResponse(report, status=400)
+    imported = import_orders_df(df[valid_mask])
+    # Points outside every county are imported without a county (warnings)
+    if mode == "strict":
+        return JsonResponse({
+            "message": "Orders imported successfully!",
+            "warning_count": report["warning_count"],
+            "warnings": report["warnings"],
+        })
+    return JsonResponse({
+        "message": f"Imported {imported} orders, rejected {len(df) - imported}",
+        "imported": imported,
+        "rejected": len(df) - imported,
+        **report,
+    })
 
 
 # POST /orders (manual input)
@@ -46,14 +86,13 @@ def create_order_api(request):
     order = process_manual_order(data)
     return JsonResponse({
         "id": order.id,
-        "timestamp": order.purchase_date.astimezone(dt_timezone.utc)
-        .replace(microsecond=0)
-        .strftime("%Y-%m-%d %H:%M:%S"),
+        "timestamp": format_timestamp(order.purchase_date),
     })
 
 
-# GET /orders (list with filters and pagination)
-def list_orders_api(request):
+# Filters shared by the sync and async list views.
+# Only builds the (lazy) queryset, no database access happens here.
+def filter_orders(request):
     orders_qs = OrderTaxRecord.objects.all().order_by("-purchase_date")
     # Filters by time
     for param, field in [("from_timestamp", "gte"), ("to_timestamp", "lte")]:
@@ -97,38 +136,152 @@ def list_orders_api(request):
             Q(city_name__icontains=search)
         )
 
-    # Pagination
+    # Map viewport: bbox=min_lon,min_lat,max_lon,max_lat (GeoJSON / Leaflet order)
+    bbox = parse_floats(request.GET.get("bbox"), 4)
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        orders_qs = orders_qs.filter(
+            latitude__range=(min_lat, max_lat),
+            longitude__range=(min_lon, max_lon),
+        )
+
+    # Radius: near=lat,lon&radius_km=5
+    near = parse_floats(request.GET.get("near"), 2)
+    radius_km = parse_floats(request.GET.get("radius_km"), 1)
+    if near and radius_km and radius_km[0] > 0:
+        orders_qs = filter_by_radius(orders_qs, near[0], near[1], radius_km[0])
+
+    return orders_qs
+
+
+def parse_floats(raw, count):
+    """Parses "a,b,..." with exactly `count` finite numbers, otherwise returns None."""
+    if not raw:
+        return None
+    try:
+        values = [float(v) for v in raw.split(",")]
+    except ValueError:
+        return None
+    if len(values) != count or not all(math.isfinite(v) for v in values):
+        return None
+    return values
+
+
+def filter_by_radius(orders_qs, lat, lon, radius_km):
+    """
+    Orders within radius_km of (lat, lon).
+    A lat/lon bounding box is applied first, so the database can use
+    order_lat_lon_idx; the exact haversine distance is then checked
+    only for the rows inside the box.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    orders_qs = orders_qs.filter(latitude__range=(lat - dlat, lat + dlat))
+    # Longitude degrees shrink towards the poles; near a pole the box
+    # covers every longitude, so only the latitude prefilter is used
+    cos_lat = math.cos(math.radians(lat))
+    if abs(lat) + dlat < 90 and cos_lat > 0:
+        dlon = dlat / cos_lat
+        if dlon < 180:
+            orders_qs = orders_qs.filter(longitude__range=(lon - dlon, lon + dlon))
+
+    half_dlat = Radians(F("latitude") - lat) / 2
+    half_dlon = Radians(F("longitude") - lon) / 2
+    a = (
+        Power(Sin(half_dlat), 2)
+        + cos_lat * Cos(Radians(F("latitude"))) * Power(Sin(half_dlon), 2)
+    )
+    # Rounding can make `a` slightly greater than 1 for (near-)antipodal points,
+    # and ASIN() of that is a domain error on PostgreSQL, so it is clamped
+    distance = Value(2 * EARTH_RADIUS_KM) * ASin(Least(Sqrt(a), Value(1.0)))
+    return orders_qs.alias(
+        distance_km=ExpressionWrapper(distance, output_field=FloatField())
+    ).filter(distance_km__lte=radius_km)
+
+
+# GET /orders (list with filters and pagination)
+@profiled
+def list_orders_api(request):
+    orders_qs = filter_orders(request)
+
+    # Pagination (only the columns we serialize, no model instances)
     page_number = request.GET.get("page", 1)
-    page_size = request.GET.get("page_size", 20)
-    paginator = Paginator(orders_qs, page_size)
-    page_obj = paginator.get_page(page_number)
-
-    results = [
-        {
-            "id": str(order.id),
-            "latitude": float(order.latitude),
-            "longitude": float(order.longitude),
-            "subtotal": float(order.subtotal),
-            "composite_tax_rate": float(order.composite_tax_rate),
-            "tax_amount": float(order.tax_amount),
-            "total_amount": float(order.total_amount),
-            "timestamp": order.purchase_date.astimezone(dt_timezone.utc)
-            .replace(microsecond=0)
-            .strftime("%Y-%m-%d %H:%M:%S"),
-            "state_rate": float(order.state_rate),
-            "county_rate": float(order.county_rate),
-            "city_rate": float(order.city_rate),
-            "special_rates": float(order.special_rates),
-            "state": order.state_name,
-            "county": order.county_name or "",
-            "city": order.city_name or "",
-        }
-        for order in page_obj
-    ]
+    page_size = parse_page_size(request.GET.get("page_size"))
+    paginator = Paginator(orders_qs.values_list(*ORDER_LIST_FIELDS), page_size)
+    with profile_stage("query"):
+        page_obj = paginator.get_page(page_number)
+        rows = list(page_obj)
+    with profile_stage("serialize"):
+        return fast_json_response({
+            "count": paginator.count,
+            "num_pages": paginator.num_pages,
+            "current_page": page_obj.number,
+            "results": serialize_order_rows(rows),
+        })
+
+
+# GET /orders/profiles/<id> (staff only)
+# Downloads the profile artifact saved by @profiled, ?summary=1 returns
+# the stage timing / SQL summary instead
+def profile_download_api(request, profile_id):
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Forbidden"}, status=403)
+    if not re.fullmatch(r"[0-9a-f]{32}", profile_id):
+        return JsonResponse({"error": "Profile not found"}, status=404)
+    directory = profile_dir()
+    if request.GET.get("summary"):
+        candidates = [directory / f"{profile_id}.json"]
+    else:
+        candidates = [directory / f"{profile_id}.prof", directory / f"{profile_id}.html"]
+    for path in candidates:
+        if path.exists():
+            return FileResponse(open(path, "rb"), as_attachment=path.suffix != ".json")
+    return JsonResponse({"error": "Profile not found"}, status=404)
 
+
+# Async variants for ASGI deployments (see ASYNC_VIEWS in settings.py).
+# They return the same responses as the sync views above.
+
+# POST /orders (manual input, async)
+@csrf_exempt
+async def create_order_api_async(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    order = await aprocess_manual_order(data)
     return JsonResponse({
-        "count": paginator.count,
-        "num_pages": paginator.num_pages,
-        "current_page": page_obj.number,
-        "results": results,
-    })
\ No newline at end of file
+        "id": order.id,
+        "timestamp": format_timestamp(order.purchase_date),
+    })
+
+
+# GET /orders/list (async)
+async def list_orders_api_async(request):
+    orders_qs = filter_orders(request)
+
+    # Paginator is sync-only, so we reproduce Paginator.get_page() here:
+    # non-integer page -> first page, page out of range -> last page
+    page_size = parse_page_size(request.GET.get("page_size"))
+    count = await orders_qs.acount()
+    num_pages = max(1, math.ceil(count / page_size))
+    try:
+        page_number = int(request.GET.get("page", 1))
+    except (TypeError, ValueError):
+        page_number = 1
+    if page_number < 1 or page_number > num_pages:
+        page_number = num_pages
+
+    offset = (page_number - 1) * page_size
+    rows = [
+        row async for row in
+        orders_qs.values_list(*ORDER_LIST_FIELDS)[offset:offset + page_size]
+    ]
+
+    return fast_json_response({
+        "count": count,
+        "num_pages": num_pages,
+        "current_page": page_number,
+        "results": serialize_order_rows(rows),
+    })